@@ -29,31 +29,157 @@ serpens_openid_connection.py: Manages connections to Serpens OpenID server.
 __author__ = "Mizanul H. Chowdhury"
 __email__ = "mizanul@mit.edu"
 
-from datetime import datetime, timedelta
+import base64
+import contextlib
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import weakref
+
+try:
+    import orjson
+except ImportError:  # optional, speeds up serializing large POST bodies
+    orjson = None
 
 from .connection import SerpensConnectionManager
 from .exceptions import SerpensPostError
 from .serpens_openid import SerpensOpenID
 
+logger = logging.getLogger(__name__)
+
+# Fraction of the time until the refresh deadline after which the background refresh runs
+_BACKGROUND_REFRESH_FRACTION = 0.8
+
+# Refresh failures that mean a fresh login is needed instead
+_REFRESH_ERR_RE = re.compile(rb"Refresh token expired|Token is not active|Session not active")
+
+# Process-wide token cache shared by every connection using the same credentials,
+# mapping cache key -> (token, monotonic deadline), with one fetch lock per key
+_TOKEN_CACHE = {}
+_TOKEN_CACHE_LOCKS = {}
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+# Process-wide SerpensOpenID instances, so connections to the same client share one
+_SERPENS_OPENID_CACHE = {}
+_SERPENS_OPENID_CACHE_LOCK = threading.Lock()
+
+def _token_cache_lock(key):
+    """
+    Returns the lock serializing token fetches for one token cache key.
+
+    Args:
+        key (tuple): Token cache key.
+
+    Returns:
+        threading.RLock: Lock for the key.
+    """
+    with _TOKEN_CACHE_LOCK:
+        return _TOKEN_CACHE_LOCKS.setdefault(key, threading.RLock())
+
+def _dumps(obj):
+    """
+    Serializes a request body to compact JSON bytes, using orjson when available.
+
+    Args:
+        obj (dict): Request body.
+
+    Returns:
+        bytes: Serialized body.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+def _background_refresh(connection_ref, token):
+    """
+    Timer callback refreshing a connection's token ahead of its deadline.
+
+    Args:
+        connection_ref (weakref.ref): Connection to refresh; the timer must not keep it alive.
+        token (dict): Token the timer was scheduled for.
+    """
+    connection = connection_ref()
+    if connection is None:
+        return
+    with connection._refresh_lock:
+        # skip if a request already refreshed it while we waited for the lock
+        if connection._token is not token:
+            return
+        try:
+            connection.refresh_token()
+        except Exception:
+            # the next request past the deadline retries synchronously
+            logger.warning("Background token refresh failed", exc_info=True)
+
+def _decode_claims(access_token):
+    """
+    Decodes the payload of a JWT access token without verifying it.
+
+    Args:
+        access_token (str): Access token.
+
+    Returns:
+        dict: Token claims, or None if the token is not a decodable JWT.
+    """
+    try:
+        payload = access_token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def _token_lifetime(token, claims):
+    """
+    Computes how many seconds a token stays valid without relying on the local clock.
+
+    The exp/iat claims are both stamped by the server's clock, so their difference is
+    immune to client drift. Without iat, exp is only used to shorten expires_in.
+
+    Args:
+        token (dict): Token, or None.
+        claims (dict): Decoded access token claims, or None.
+
+    Returns:
+        float: Lifetime in seconds.
+    """
+    if not token:
+        return 0
+    claims = claims if isinstance(claims, dict) else {}
+    exp, iat = claims.get("exp"), claims.get("iat")
+    if isinstance(exp, (int, float)) and isinstance(iat, (int, float)) and exp > iat:
+        return exp - iat
+    lifetime = token["expires_in"]
+    if isinstance(exp, (int, float)) and exp - time.time() > 0:
+        lifetime = min(lifetime, exp - time.time())
+    return lifetime
+
 class SerpensOpenIDConnection(SerpensConnectionManager):
     """
     Manages connections to Serpens OpenID server.
     """
 
-    # Class variables for connection parameters
-    _server_url = None
-    _username = None
-    _password = None
-    _totp = None
-    _realm_name = None
-    _client_id = None
-    _verify = None
-    _client_secret_key = None
-    _connection = None
-    _custom_headers = None
-    _user_realm_name = None
-    _expires_at = None
-    _serpens_openid = None
+    # Plain attribute storage; only properties with behaviour remain below
+    __slots__ = (
+        "username",
+        "password",
+        "totp",
+        "realm_name",
+        "client_id",
+        "client_secret_key",
+        "user_realm_name",
+        "token_lifetime_fraction",
+        "_skew_seconds",
+        "_refresh_lock",
+        "_token",
+        "_expires_at",
+        "_auth_header_value",
+        "_token_claims",
+        "_cancel_refresh",
+        "_initialized",
+        "_serpens_openid",
+    )
 
     def __init__(
         self,
@@ -69,6 +195,7 @@ class SerpensOpenIDConnection(SerpensConnectionManager):
         custom_headers=None,
         user_realm_name=None,
         timeout=60,
+        skew_seconds=300,
     ):
         """
         Initializes SerpensOpenIDConnection object.
@@ -86,9 +213,16 @@ class SerpensOpenIDConnection(SerpensConnectionManager):
             custom_headers (dict): Custom headers for requests.
             user_realm_name (str): User realm name.
             timeout (int): Timeout for requests.
+            skew_seconds (int): Seconds to refresh the token ahead of expiry.
         """
-        # Set default token lifetime fraction
+        # Set default token lifetime fraction and clock-skew buffer
         self.token_lifetime_fraction = 0.9
+        self._skew_seconds = skew_seconds
+        self._refresh_lock = threading.Lock()
+        self._serpens_openid = None
+        self._cancel_refresh = None
+        # the background refresh only starts once every field below is set
+        self._initialized = False
 
         # Set connection parameters
         self.server_url = server_url
@@ -107,18 +241,22 @@ class SerpensOpenIDConnection(SerpensConnectionManager):
         if self.token is None:
             self.get_token()
 
-        # Set headers for requests
-        self.headers = {
-            "Authorization": "Bearer " + self.token.get("access_token"),
-            "Content-Type": "application/json",
-        } if self.token is not None else {}
-        self.custom_headers = custom_headers
+        # Build the headers dict once; refreshes only update Authorization in place
+        self.headers = {}
+        if self.token is not None:
+            self.set_param_headers("Authorization", self._auth_header_value)
+            self.set_param_headers("Content-Type", "application/json")
+        if custom_headers:
+            self.headers.update(custom_headers)
 
         # Initialize ConnectionManager with base URL, headers, and timeout
         super().__init__(
             base_url=self.server_url, headers=self.headers, timeout=60, verify=self.verify
         )
 
+        self._initialized = True
+        self._schedule_refresh()
+
     # Property for server URL
     @property
     def server_url(self):
@@ -128,42 +266,6 @@ class SerpensOpenIDConnection(SerpensConnectionManager):
     def server_url(self, value):
         self.base_url = value
 
-    # Property for client ID
-    @property
-    def client_id(self):
-        return self._client_id
-
-    @client_id.setter
-    def client_id(self, value):
-        self._client_id = value
-
-    # Property for client secret key
-    @property
-    def client_secret_key(self):
-        return self._client_secret_key
-
-    @client_secret_key.setter
-    def client_secret_key(self, value):
-        self._client_secret_key = value
-
-    # Property for username
-    @property
-    def username(self):
-        return self._username
-
-    @username.setter
-    def username(self, value):
-        self._username = value
-
-    # Property for password
-    @property
-    def password(self):
-        return self._password
-
-    @password.setter
-    def password(self, value):
-        self._password = value
-
     # Property for token
     @property
     def token(self):
@@ -171,16 +273,63 @@ class SerpensOpenIDConnection(SerpensConnectionManager):
 
     @token.setter
     def token(self, value):
+        self._set_token(value)
+
+    def _set_token(self, value, expires_at=None):
+        """
+        Stores a token and derives its deadline, header value and background refresh.
+
+        Args:
+            value (dict): Token, or None.
+            expires_at (float): Monotonic refresh deadline, computed from the token if None.
+        """
         self._token = value
-        self._expires_at = datetime.now() + timedelta(
-            seconds=int(self.token_lifetime_fraction * self.token["expires_in"] if value else 0)
+        self._token_claims = _decode_claims(value.get("access_token")) if value else None
+        if expires_at is None:
+            lifetime = self.token_lifetime_fraction * _token_lifetime(value, self._token_claims)
+            # Never let the skew buffer eat more than half of a short-lived token
+            skew = min(self._skew_seconds, lifetime / 2)
+            expires_at = time.monotonic() + lifetime - skew
+        self._expires_at = expires_at
+        # Pre-encoded so the transport sends it without re-encoding per request
+        self._auth_header_value = (
+            f"Bearer {value['access_token']}".encode("ascii") if value else None
         )
+        if self._initialized:
+            self._schedule_refresh()
 
-    # Property for expiration time of the token
+    def _schedule_refresh(self):
+        """
+        Schedules a background refresh of the current token well before its deadline.
+        """
+        if self._cancel_refresh is not None:
+            self._cancel_refresh()
+            self._cancel_refresh = None
+        value = self._token
+        window = self._expires_at - time.monotonic()
+        # without a refresh token or credentials a refresh would only drop the token
+        if not value or window <= 0 or not (value.get("refresh_token") or self._grant_type()):
+            return
+        timer = threading.Timer(
+            _BACKGROUND_REFRESH_FRACTION * window,
+            _background_refresh,
+            args=(weakref.ref(self), value),
+        )
+        timer.daemon = True
+        timer.start()
+        # also cancels the timer if the connection is dropped without close()
+        self._cancel_refresh = weakref.finalize(self, timer.cancel)
+
+    # Property for expiration time of the token (monotonic clock deadline)
     @property
     def expires_at(self):
         return self._expires_at
 
+    # Property for the decoded claims of the access token
+    @property
+    def token_claims(self):
+        return self._token_claims
+
     # Property for SerpensOpenID instance
     @property
     def serpens_openid(self) -> SerpensOpenID:
@@ -192,14 +341,30 @@ class SerpensOpenIDConnection(SerpensConnectionManager):
             else:
                 token_realm_name = "master"
 
-            self._serpens_openid = SerpensOpenID(
-                server_url=self.server_url,
-                client_id=self.client_id,
-                realm_name=token_realm_name,
-                verify=self.verify,
-                client_secret_key=self.client_secret_key,
-                timeout=self.timeout,
+            secret_digest = hashlib.sha256(
+                (self.client_secret_key or "").encode("utf-8")
+            ).hexdigest()
+            key = (
+                self.server_url,
+                token_realm_name,
+                self.client_id,
+                self.verify,
+                secret_digest,
+                self.timeout,
             )
+            with _SERPENS_OPENID_CACHE_LOCK:
+                serpens_openid = _SERPENS_OPENID_CACHE.get(key)
+                if serpens_openid is None:
+                    serpens_openid = SerpensOpenID(
+                        server_url=self.server_url,
+                        client_id=self.client_id,
+                        realm_name=token_realm_name,
+                        verify=self.verify,
+                        client_secret_key=self.client_secret_key,
+                        timeout=self.timeout,
+                    )
+                    _SERPENS_OPENID_CACHE[key] = serpens_openid
+            self._serpens_openid = serpens_openid
 
         return self._serpens_openid
 
@@ -207,56 +372,171 @@ class SerpensOpenIDConnection(SerpensConnectionManager):
         """
         Obtains a new token based on the specified grant type.
         """
+        grant_type = self._grant_type()
+        if not grant_type:
+            self.token = None
+            return
+
+        key = self._token_cache_key()
+        # Holding the per-key lock while fetching coalesces concurrent logins into one request
+        with _token_cache_lock(key):
+            if self._adopt_cached_token(key):
+                return
+
+            self.token = self.serpens_openid.token(
+                self.username, self.password, grant_type=grant_type, totp=self.totp
+            )
+            _TOKEN_CACHE[key] = (self.token, self._expires_at)
+
+    def _grant_type(self):
+        """
+        Picks the grant type from the configured credentials.
+
+        Returns:
+            list: Grant types, empty if no credentials are configured.
+        """
         grant_type = []
         if self.client_secret_key:
             grant_type.append("client_credentials")
         elif self.username and self.password:
             grant_type.append("password")
+        return grant_type
 
-        if grant_type:
-            self.token = self.serpens_openid.token(
-                self.username, self.password, grant_type=grant_type, totp=self.totp
-            )
-        else:
-            self.token = None
+    def _adopt_cached_token(self, key):
+        """
+        Switches to the cached token for the key if it is valid and not the current token.
+
+        The current token is never re-adopted: reaching here with it means it expired
+        or the server rejected it.
+
+        Args:
+            key (tuple): Token cache key.
+
+        Returns:
+            bool: True if the cached token was adopted.
+        """
+        cached = _TOKEN_CACHE.get(key)
+        if cached is None or cached[0] is self._token or time.monotonic() >= cached[1]:
+            return False
+        self._set_token(*cached)
+        return True
+
+    def _token_cache_key(self):
+        """
+        Builds the process-wide token cache key for this connection.
+
+        Returns:
+            tuple: Server URL, realm, client ID and a digest of the credentials.
+        """
+        credentials = "\0".join(
+            value or "" for value in (self.username, self.password, self.client_secret_key)
+        )
+        return (
+            self.server_url,
+            self.user_realm_name or self.realm_name,
+            self.client_id,
+            hashlib.sha256(credentials.encode("utf-8")).hexdigest(),
+        )
 
     def refresh_token(self):
         """
         Refreshes the token if a refresh token is available.
         """
+        # Connections sharing credentials share one refresh: whoever gets the key lock
+        # first refreshes and caches the result, the others adopt it
+        key = self._token_cache_key() if self._grant_type() else None
+        with _token_cache_lock(key) if key is not None else contextlib.nullcontext():
+            if key is None or not self._adopt_cached_token(key):
+                self._refresh_token(key)
+
+        self.set_param_headers("Authorization", self._auth_header_value)
+
+    def _refresh_token(self, key):
+        """
+        Refreshes the token against the server, falling back to a new login.
+
+        Args:
+            key (tuple): Token cache key to store the result under, or None.
+        """
         refresh_token = self.token.get("refresh_token", None) if self.token else None
         if refresh_token is None:
             self.get_token()
-        else:
-            try:
-                self.token = self.serpens_openid.refresh_token(refresh_token)
-            except SerpensPostError as e:
-                list_errors = [
-                    b"Refresh token expired",
-                    b"Token is not active",
-                    b"Session not active",
-                ]
-                if e.response_code == 400 and any(err in e.response_body for err in list_errors):
-                    self.get_token()
-                else:
-                    raise
-
-        self.add_param_headers("Authorization", "Bearer " + self.token.get("access_token"))
+            return
+
+        try:
+            self.token = self.serpens_openid.refresh_token(refresh_token)
+        except SerpensPostError as e:
+            if e.response_code == 400 and _REFRESH_ERR_RE.search(e.response_body) is not None:
+                self.get_token()
+                return
+            raise
+
+        if key is not None:
+            _TOKEN_CACHE[key] = (self.token, self._expires_at)
+
+    def close(self):
+        """
+        Cancels the background token refresh and closes the session.
+        """
+        if self._cancel_refresh is not None:
+            self._cancel_refresh()
+        super().close()
 
     def _refresh_if_required(self):
         """
         Refreshes the token if it is required based on expiration time.
         """
-        if datetime.now() >= self.expires_at:
-            self.refresh_token()
+        # Double-checked so only one thread refreshes an expired token
+        if time.monotonic() >= self._expires_at:
+            with self._refresh_lock:
+                if time.monotonic() >= self._expires_at:
+                    self.refresh_token()
 
-    # Overridden send_get method
-    def send_get(self, *args, **kwargs):
+    def _send_with_refresh(self, send, *args, **kwargs):
+        """
+        Sends a request, refreshing the token once and retrying on HTTP 401.
+
+        Args:
+            send (callable): Parent send method to invoke.
+            args: Positional arguments for the request.
+            kwargs: Additional parameters for the request.
+
+        Returns:
+            requests.Response: Response object.
+        """
         self._refresh_if_required()
-        r = super().send_get(*args, **kwargs)
+        token = self._token
+        r = send(*args, **kwargs)
+        if r.status_code == 401:
+            with self._refresh_lock:
+                # Another thread may already have refreshed after its own 401
+                if self._token is token:
+                    self.refresh_token()
+            r = send(*args, **kwargs)
         return r
 
+    # Overridden send_get method
+    def send_get(self, *args, **kwargs):
+        return self._send_with_refresh(super().send_get, *args, **kwargs)
+
+    def _encode_body(self, data):
+        """
+        Serializes dict bodies to JSON when the connection declares a JSON Content-Type.
+
+        Args:
+            data: Request body.
+
+        Returns:
+            Body to hand to the transport.
+        """
+        if isinstance(data, dict) and self.get_param_headers("Content-Type") == "application/json":
+            return _dumps(data)
+        return data
+
     # Overridden send_post method
-    def send_post(self, *args, **kwargs):
-        self._refresh_if_required()
-        r = super().send_post(*args, **kwargs)
+    def send_post(self, path, data, **kwargs):
+        return self._send_with_refresh(super().send_post, path, self._encode_body(data), **kwargs)
+
+    # Overridden send_put method
+    def send_put(self, path, data, **kwargs):
+        return super().send_put(path, self._encode_body(data), **kwargs)
@@ -25,16 +25,98 @@ SOFTWARE.
 __author__ = "Mizanul H. Chowdhury"
 __email__ = "mizanul@mit.edu"
 
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from functools import lru_cache
 from urllib.parse import urljoin
 import requests
 from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # optional, only needed by AsyncSerpensConnectionManager
+    httpx = None
+
+# Upper bound on cached GET responses per connection manager
+_GET_CACHE_MAXSIZE = 256
+
+_RETRY_METHODS = frozenset({"GET", "POST", "PUT", "DELETE", "HEAD", "OPTIONS"})
+
+
+@lru_cache(maxsize=1024)
+def _join(base, path):
+    """
+    Join a base URL and a path, memoized since admin paths repeat heavily.
+    """
+    return urljoin(base, path)
+
+
+def _snapshot_response(r):
+    """
+    Captures the parts of a response the GET cache replays.
+
+    Args:
+        r (requests.Response): Response to capture; its body is read.
+
+    Returns:
+        tuple: Status code, reason, URL, encoding, headers and body.
+    """
+    return (r.status_code, r.reason, r.url, r.encoding, dict(r.headers), r.content)
+
+
+def _replay_response(snapshot):
+    """
+    Builds a fresh response from a cached snapshot, sharing no mutable state with it.
+
+    Args:
+        snapshot (tuple): Snapshot from _snapshot_response.
+
+    Returns:
+        requests.Response: Response object.
+    """
+    r = requests.Response()
+    r.status_code, r.reason, r.url, r.encoding, headers, r._content = snapshot
+    r.headers = CaseInsensitiveDict(headers)
+    return r
+
+
+def _no_auth(r):
+    """
+    Session auth hook that leaves the prepared request untouched.
+    """
+    return r
+
+
+class SerpensNetworkError(Exception):
+    """
+    Raised when a request to a Serpens service fails at the transport level.
+    """
+
 
 class SerpensConnectionManager(object):
     """
     Manages HTTP connections for Serpens services.
     """
 
-    def __init__(self, base_url, headers={}, timeout=60, verify=True, proxies=None):
+    # __weakref__ is needed by weakref.finalize
+    __slots__ = (
+        "_base_url",
+        "_headers",
+        "_timeout",
+        "_verify",
+        "_s",
+        "_finalizer",
+        "_get_cache",
+        "_get_cache_lock",
+        "_get_cache_generation",
+        "__weakref__",
+    )
+
+    def __init__(self, base_url, headers=None, timeout=60, verify=True, proxies=None):
         """
         Initializes SerpensConnectionManager object.
 
@@ -46,30 +128,44 @@ class SerpensConnectionManager(object):
             proxies (dict): Proxy settings for requests.
         """
         self.base_url = base_url
-        self.headers = headers
+        self.headers = {} if headers is None else headers
         self.timeout = timeout
         self.verify = verify
         self._s = requests.Session()
-        self._s.auth = lambda x: x  # don't let requests add auth headers
+        # don't let requests add auth headers; None would fall back to ~/.netrc
+        self._s.auth = _no_auth
+        # closes the session on collection without the cycle-GC cost of __del__
+        self._finalizer = weakref.finalize(self, self._s.close)
+        # opt-in LRU GET response cache, mapping (path, params) -> (deadline, snapshot);
+        # the generation changes around every write so in-flight reads are not stored
+        self._get_cache = OrderedDict()
+        self._get_cache_lock = threading.Lock()
+        self._get_cache_generation = 0
 
         for protocol in ("https://", "http://"):
-            adapter = HTTPAdapter(max_retries=1)
-            # adds POST to retry whitelist
-            allowed_methods = set(adapter.max_retries.allowed_methods)
-            allowed_methods.add("POST")
-            adapter.max_retries.allowed_methods = frozenset(allowed_methods)
-
+            # pools sized for concurrent admin fan-out; POST is retried as well
+            adapter = HTTPAdapter(
+                max_retries=Retry(total=1, allowed_methods=_RETRY_METHODS),
+                pool_connections=32,
+                pool_maxsize=64,
+                pool_block=False,
+            )
             self._s.mount(protocol, adapter)
 
         if proxies:
             self._s.proxies.update(proxies)
 
-    def __del__(self):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
         """
-        Closes the session when the object is deleted.
+        Closes the session. Safe to call more than once.
         """
-        if hasattr(self, "_s"):
-            self._s.close()
+        self._finalizer()
 
     # Property for base URL
     @property
@@ -115,9 +211,13 @@ class SerpensConnectionManager(object):
             key (str): Header key.
 
         Returns:
-            str: Header value or None if key is not present.
+            str: Header value or None if key is not present. Values stored pre-encoded
+                as bytes (e.g. Authorization) are returned decoded.
         """
-        return self.headers.get(key)
+        value = self.headers.get(key)
+        if isinstance(value, bytes):
+            return value.decode("latin-1")
+        return value
 
     def clean_headers(self):
         """
@@ -156,27 +256,110 @@ class SerpensConnectionManager(object):
         """
         self.headers.pop(key, None)
 
-    def send_get(self, path, **kwargs):
+    def _send(self, method, path, data=None, params=None):
         """
-        Perform a raw HTTP GET request.
+        Perform a raw HTTP request.
 
         Args:
-            path (str): Path for the GET request.
-            kwargs: Additional parameters for the request.
+            method (str): HTTP method.
+            path (str): Path for the request.
+            data: Data to include in the request.
+            params (dict): Query parameters.
 
         Returns:
             requests.Response: Response object.
+
+        Raises:
+            SerpensNetworkError: If the request fails to reach the server.
         """
+        if method == "GET":
+            return self._request(method, path, data, params)
+
+        # any write may change what a cached read would return, so invalidate both
+        # before and after it; reads started meanwhile see a new generation
+        self._invalidate_get_cache()
         try:
-            return self._s.get(
-                urljoin(self.base_url, path),
-                params=kwargs,
+            return self._request(method, path, data, params)
+        finally:
+            self._invalidate_get_cache()
+
+    def _request(self, method, path, data, params):
+        """
+        Sends a request on the session without touching the GET cache.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Path for the request.
+            data: Data to include in the request.
+            params (dict): Query parameters.
+
+        Returns:
+            requests.Response: Response object.
+
+        Raises:
+            SerpensNetworkError: If the request fails to reach the server.
+        """
+        try:
+            return self._s.request(
+                method,
+                _join(self._base_url, path),
+                params=params,
+                data=data,
                 headers=self.headers,
                 timeout=self.timeout,
                 verify=self.verify,
             )
-        except Exception as e:
-            pass
+        except requests.exceptions.RequestException as e:
+            raise SerpensNetworkError("Can't connect to server (%s)" % e) from e
+
+    def _invalidate_get_cache(self):
+        """
+        Drops all cached GET responses and starts a new cache generation.
+        """
+        with self._get_cache_lock:
+            self._get_cache.clear()
+            self._get_cache_generation += 1
+
+    def send_get(self, path, cache_ttl=None, **kwargs):
+        """
+        Perform a raw HTTP GET request.
+
+        Args:
+            path (str): Path for the GET request.
+            cache_ttl (float): Seconds to reuse a successful response, disabled if None.
+            kwargs: Additional parameters for the request.
+
+        Returns:
+            requests.Response: Response object.
+        """
+        if not cache_ttl:
+            return self._send("GET", path, params=kwargs)
+
+        try:
+            key = (path, frozenset(kwargs.items()))
+            hash(key)
+        except TypeError:  # e.g. list-valued params
+            return self._send("GET", path, params=kwargs)
+
+        with self._get_cache_lock:
+            cached = self._get_cache.get(key)
+            if cached is not None:
+                if time.monotonic() < cached[0]:
+                    self._get_cache.move_to_end(key)
+                    return _replay_response(cached[1])
+                del self._get_cache[key]
+            generation = self._get_cache_generation
+
+        r = self._send("GET", path, params=kwargs)
+        if r.ok:
+            snapshot = _snapshot_response(r)
+            with self._get_cache_lock:
+                if generation == self._get_cache_generation:
+                    self._get_cache[key] = (time.monotonic() + cache_ttl, snapshot)
+                    self._get_cache.move_to_end(key)
+                    while len(self._get_cache) > _GET_CACHE_MAXSIZE:
+                        self._get_cache.popitem(last=False)
+        return r
 
     def send_post(self, path, data, **kwargs):
         """
@@ -190,17 +373,7 @@ class SerpensConnectionManager(object):
         Returns:
             requests.Response: Response object.
         """
-        try:
-            return self._s.post(
-                urljoin(self.base_url, path),
-                params=kwargs,
-                data=data,
-                headers=self.headers,
-                timeout=self.timeout,
-                verify=self.verify,
-            )
-        except Exception as e:
-            pass
+        return self._send("POST", path, data=data, params=kwargs)
 
     def send_put(self, path, data, **kwargs):
         """
@@ -214,17 +387,7 @@ class SerpensConnectionManager(object):
         Returns:
             requests.Response: Response object.
         """
-        try:
-            return self._s.put(
-                urljoin(self.base_url, path),
-                params=kwargs,
-                data=data,
-                headers=self.headers,
-                timeout=self.timeout,
-                verify=self.verify,
-            )
-        except Exception as e:
-            pass
+        return self._send("PUT", path, data=data, params=kwargs)
 
     def send_delete(self, path, data=None, **kwargs):
         """
@@ -238,14 +401,148 @@ class SerpensConnectionManager(object):
         Returns:
             requests.Response: Response object.
         """
+        return self._send("DELETE", path, data=data or dict(), params=kwargs)
+
+
+class AsyncSerpensConnectionManager(object):
+    """
+    Manages asynchronous HTTP/2 connections for Serpens services.
+
+    Concurrent requests (e.g. fanned out with ``asyncio.gather``) are multiplexed
+    over a single connection. Requires ``httpx`` with HTTP/2 support
+    (``pip install httpx[http2]``).
+    """
+
+    def __init__(self, base_url, headers=None, timeout=60, verify=True, proxies=None):
+        """
+        Initializes AsyncSerpensConnectionManager object.
+
+        Args:
+            base_url (str): Base URL for the Serpens service.
+            headers (dict): Headers to include in requests.
+            timeout (int): Timeout for HTTP requests.
+            verify (bool): Verify SSL/TLS.
+            proxies (dict): Proxy settings for requests.
+        """
+        if httpx is None:
+            raise ImportError("AsyncSerpensConnectionManager requires httpx[http2]")
+
+        self.base_url = base_url
+        self.headers = {} if headers is None else headers
+        self.timeout = timeout
+        self.verify = verify
+        # requests-style proxies ({"https": url}) map onto per-scheme transports
+        mounts = {
+            scheme.rstrip(":/") + "://": httpx.AsyncHTTPTransport(
+                proxy=url, http2=True, verify=verify
+            )
+            for scheme, url in (proxies or {}).items()
+        }
+        self._s = httpx.AsyncClient(
+            http2=True, timeout=timeout, verify=verify, mounts=mounts
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        """
+        Closes the underlying client.
+        """
+        await self._s.aclose()
+
+    get_param_headers = SerpensConnectionManager.get_param_headers
+    clean_headers = SerpensConnectionManager.clean_headers
+    has_param_headers = SerpensConnectionManager.has_param_headers
+    set_param_headers = SerpensConnectionManager.set_param_headers
+    remove_param_headers = SerpensConnectionManager.remove_param_headers
+
+    async def _send(self, method, path, data=None, params=None):
+        """
+        Perform a raw HTTP request.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Path for the request.
+            data: Data to include in the request.
+            params (dict): Query parameters.
+
+        Returns:
+            httpx.Response: Response object.
+
+        Raises:
+            SerpensNetworkError: If the request fails to reach the server.
+        """
+        # dicts are form-encoded like requests does; str/bytes are sent as-is
+        if isinstance(data, dict):
+            body = {"data": data}
+        else:
+            body = {"content": data}
         try:
-            return self._s.delete(
-                urljoin(self.base_url, path),
-                params=kwargs,
-                data=data or dict(),
+            return await self._s.request(
+                method,
+                _join(self.base_url, path),
+                params=params,
                 headers=self.headers,
-                timeout=self.timeout,
-                verify=self.verify,
+                **body,
             )
-        except Exception as e:
-            pass
+        except httpx.TransportError as e:
+            raise SerpensNetworkError("Can't connect to server (%s)" % e) from e
+
+    async def send_get(self, path, **kwargs):
+        """
+        Perform a raw HTTP GET request.
+
+        Args:
+            path (str): Path for the GET request.
+            kwargs: Additional parameters for the request.
+
+        Returns:
+            httpx.Response: Response object.
+        """
+        return await self._send("GET", path, params=kwargs)
+
+    async def send_post(self, path, data, **kwargs):
+        """
+        Perform a raw HTTP POST request.
+
+        Args:
+            path (str): Path for the POST request.
+            data: Data to include in the request.
+            kwargs: Additional parameters for the request.
+
+        Returns:
+            httpx.Response: Response object.
+        """
+        return await self._send("POST", path, data=data, params=kwargs)
+
+    async def send_put(self, path, data, **kwargs):
+        """
+        Perform a raw HTTP PUT request.
+
+        Args:
+            path (str): Path for the PUT request.
+            data: Data to include in the request.
+            kwargs: Additional parameters for the request.
+
+        Returns:
+            httpx.Response: Response object.
+        """
+        return await self._send("PUT", path, data=data, params=kwargs)
+
+    async def send_delete(self, path, data=None, **kwargs):
+        """
+        Perform a raw HTTP DELETE request.
+
+        Args:
+            path (str): Path for the DELETE request.
+            data: Data to include in the request.
+            kwargs: Additional parameters for the request.
+
+        Returns:
+            httpx.Response: Response object.
+        """
+        return await self._send("DELETE", path, data=data or dict(), params=kwargs)